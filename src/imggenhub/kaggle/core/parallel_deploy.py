@@ -8,21 +8,52 @@ them to separate Kaggle kernels for parallel execution.
 
 import json
 import logging
+import os
 import shutil
 import tempfile
-import time
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
 
 from kaggle_connector import JobManager, SelectiveDownloader
 from imggenhub.kaggle.utils.config_loader import load_kaggle_config
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+from imggenhub.kaggle.utils.filesystem import iter_image_files, move_file
+from imggenhub.kaggle.utils.poll_status import poll_until_complete, request_poll, wait_for_new_run, INITIAL_POLL_INTERVAL
 
 # Constants for parallel execution
 PARALLEL_THRESHOLD = 4
 
+# Kaggle datasets (under the user's namespace) attached to FLUX GGUF kernels
+FLUX_GGUF_DATASETS = (
+    "flux1-schnell-q4-zip",
+    "vae-zip",
+    "clip-l-zip",
+    "t5xxl-zip",
+    "sd-build-zip",
+)
+
+# Notebook type -> marker matched case-insensitively against the notebook path
+NOTEBOOK_TYPE_MARKERS = {
+    "flux-gguf": "flux-gguf",
+}
+
+# Extra datasets (under the user's namespace) attached per notebook type
+NOTEBOOK_DATASETS = {
+    "flux-gguf": FLUX_GGUF_DATASETS,
+}
+
+# deploy_kwargs keys injected into FLUX GGUF notebooks (when set) -> notebook parameter
+FLUX_GGUF_PARAMS = {
+    "model_filename": "MODEL_FILENAME",
+    "vae_repo_id": "VAE_REPO_ID",
+    "vae_filename": "VAE_FILENAME",
+    "clip_l_repo_id": "CLIP_L_REPO_ID",
+    "clip_l_filename": "CLIP_L_FILENAME",
+    "t5xxl_repo_id": "T5XXL_REPO_ID",
+    "t5xxl_filename": "T5XXL_FILENAME",
+}
+
 
 def get_deployment_ids(base_kernel_id: str) -> Tuple[str, str]:
     """Generate deployment IDs based on base kernel ID."""
@@ -49,6 +80,21 @@ def should_use_parallel(prompts: List[str]) -> bool:
     return len(prompts) > PARALLEL_THRESHOLD
 
 
+def get_notebook_types(notebook) -> FrozenSet[str]:
+    """Detect the notebook types (see NOTEBOOK_TYPE_MARKERS) from its path."""
+    nb_lower = str(notebook).lower()
+    return frozenset(nb_type for nb_type, marker in NOTEBOOK_TYPE_MARKERS.items() if marker in nb_lower)
+
+
+def get_dataset_sources(username: str, notebook_types: Iterable[str]) -> List[str]:
+    """Build the list of Kaggle datasets to attach to a kernel."""
+    dataset_sources = [f"{username}/imggenhub-hf-token"]
+    for nb_type, names in NOTEBOOK_DATASETS.items():
+        if nb_type in notebook_types:
+            dataset_sources.extend(f"{username}/{name}" for name in names)
+    return dataset_sources
+
+
 
 def _deploy_single_kernel(
     prompts_list: List[str],
@@ -81,8 +127,8 @@ def _deploy_single_kernel(
         nb_name = notebook.name
         tmp_nb_path = tmp_dir_path / nb_name
         
-        # Copy notebook to tmp dir
-        shutil.copy2(notebook, tmp_nb_path)
+        # Copy notebook contents to tmp dir (no metadata needed for a throwaway copy)
+        shutil.copyfile(notebook, tmp_nb_path)
         
         manager = JobManager(kernel_id)
         
@@ -98,28 +144,19 @@ def _deploy_single_kernel(
             "KERNEL_ID": kernel_id
         }
         
-        # Flux GGUF specific
-        if "model_filename" in deploy_kwargs:
-            params["MODEL_FILENAME"] = deploy_kwargs.get("model_filename")
-        if "vae_repo_id" in deploy_kwargs:
-            params["VAE_REPO_ID"] = deploy_kwargs.get("vae_repo_id")
-        if "vae_filename" in deploy_kwargs:
-            params["VAE_FILENAME"] = deploy_kwargs.get("vae_filename")
+        # Flux GGUF specific: same overrides as the sequential path, only when set
+        notebook_types = get_notebook_types(notebook)
+        if "flux-gguf" in notebook_types:
+            for key, param in FLUX_GGUF_PARAMS.items():
+                if deploy_kwargs.get(key):
+                    params[param] = deploy_kwargs[key]
         
         manager.edit_notebook_params(str(tmp_nb_path), params)
         
         # 2. Metadata configuration
         gpu = deploy_kwargs.get("gpu", True)
         username = deploy_kwargs.get("username", "leventecsibi")
-        dataset_sources = [f"{username}/imggenhub-hf-token"]
-        if "flux-gguf" in str(notebook).lower():
-             dataset_sources.extend([
-                f"{username}/flux1-schnell-q4-zip",
-                f"{username}/vae-zip",
-                f"{username}/clip-l-zip",
-                f"{username}/t5xxl-zip",
-                f"{username}/sd-build-zip"
-             ])
+        dataset_sources = get_dataset_sources(username, notebook_types)
         
         kernel_type = "notebook" if nb_name.endswith(".ipynb") else "script"
         manager.create_metadata(
@@ -144,24 +181,18 @@ def _deploy_single_kernel(
         return kernel_id
 
 
-def _poll_kernel(kernel_id: str, max_wait: int = 1800, poll_interval: int = None) -> str:
+def _poll_kernel(kernel_id: str, max_wait: int = 1800, poll_interval: int = None, stop_event: threading.Event = None, initial_interval: float = INITIAL_POLL_INTERVAL) -> str:
     """
-    Poll a single kernel using JobManager.
+    Poll a single kernel until it finishes, backing off from initial_interval
+    up to poll_interval seconds. Gives up after max_wait seconds; setting
+    stop_event ends the poll early.
     """
     if poll_interval is None:
         config = load_kaggle_config()
         poll_interval = config.get("polling_interval_seconds", 60)
     
     logging.info(f"Starting poll for kernel: {kernel_id}")
-    manager = JobManager(kernel_id)
-    status = manager.poll_until_complete(poll_interval=poll_interval)
-    
-    # Check for library-specific unknown status error
-    if "error_unknown_status" in status:
-        logging.error(f"Kernel {kernel_id} failed with unknown status (likely 404).")
-        raise RuntimeError(f"Kernel {kernel_id} unreachable: {status}")
-        
-    return status
+    return poll_until_complete(kernel_id, max_interval=poll_interval, timeout=max_wait, stop_event=stop_event, initial_interval=initial_interval)
 
 
 def _download_kernel_output(kernel_id: str, dest_path: Path, expected_count: int = 0) -> None:
@@ -178,6 +209,41 @@ def _download_kernel_output(kernel_id: str, dest_path: Path, expected_count: int
         logging.warning(f"Selective download from {kernel_id} reported failure or timed out.")
 
 
+def _merge_images(sources: List[Path], dest: Path) -> int:
+    """
+    Move generated images from the download folders into dest.
+
+    Images are deduplicated by filename across sources (the first source wins),
+    and names already present in dest get a numeric suffix. Existing names are
+    read from one scandir snapshot of dest rather than a stat per candidate.
+
+    Args:
+        sources: Download folders to collect from, in priority order
+        dest: Final images folder (must exist)
+
+    Returns:
+        int: Number of images moved into dest
+    """
+    taken_names = {entry.name for entry in os.scandir(dest)}
+    seen_names = set()
+    moved = 0
+    for source in sources:
+        # ONLY collect files that start with 'gen_' to avoid pulling stale artifacts
+        for image_file in iter_image_files(source):
+            if image_file.name in seen_names:
+                continue
+            seen_names.add(image_file.name)
+            target_name = image_file.name
+            counter = 1
+            while target_name in taken_names:
+                target_name = f"{image_file.stem}_{counter}{image_file.suffix}"
+                counter += 1
+            taken_names.add(target_name)
+            move_file(image_file, dest / target_name)
+            moved += 1
+    return moved
+
+
 def run_parallel_pipeline(
     dest_path: Path,
     prompts_list: List[str],
@@ -186,6 +252,8 @@ def run_parallel_pipeline(
     wait_timeout: int = None,
     retry_interval: int = None,
     polling_interval: int = None,
+    initial_polling_interval: float = INITIAL_POLL_INTERVAL,
+    poll_timeout: float = None,
     accelerator: str = None,
     **deploy_kwargs
 ) -> None:
@@ -202,7 +270,9 @@ def run_parallel_pipeline(
         kernel_path: Kernel config directory
         wait_timeout: Maximum wait time in minutes for GPU availability
         retry_interval: Interval in seconds between retries
-        polling_interval: Interval in seconds between status polls
+        polling_interval: Maximum interval in seconds between status polls
+        initial_polling_interval: First interval in seconds between status polls
+        poll_timeout: Maximum time in seconds to poll each kernel (defaults to wait_timeout)
         accelerator: Kaggle accelerator type
         **deploy_kwargs: Additional arguments for deploy.run
     """
@@ -215,6 +285,8 @@ def run_parallel_pipeline(
             retry_interval = config.get("retry_interval_seconds", 60)
         if polling_interval is None:
             polling_interval = config.get("polling_interval_seconds", 60)
+    if poll_timeout is None:
+        poll_timeout = wait_timeout * 60
 
     # Resolve deployment IDs
     base_kernel_id = deploy_kwargs.get("base_kernel_id", "leventecsibi/stable-diffusion-batch-generator")
@@ -246,9 +318,9 @@ def run_parallel_pipeline(
             accelerator=accelerator
         )
         
-        # Wait before deploying deployment2 to avoid API conflicts
-        logging.info("Waiting 15 seconds before deploying deployment2 kernel...")
-        time.sleep(15)
+        # Wait (up to 15s) for deployment1 to be registered before deploying deployment2 to avoid API conflicts
+        logging.info("Waiting for deployment1 kernel to register before deploying deployment2 kernel...")
+        wait_for_new_run(deployment1_kernel_id, max_wait=15)
         
         # Deploy deployment2 kernel
         _deploy_single_kernel(
@@ -261,17 +333,19 @@ def run_parallel_pipeline(
         )
         
         logging.info("="*80)
-        logging.info("Both kernels deployed! Waiting 30 seconds before polling...")
+        logging.info("Both kernels deployed! Waiting for deployment2 to register before polling...")
         logging.info("="*80)
         
-        time.sleep(30)
+        wait_for_new_run(deployment2_kernel_id, max_wait=30)
         
-        # Poll both kernels in parallel using threads
+        # Poll both kernels in parallel using threads. A failure in one kernel
+        # stops the other poll right away since the run is aborted anyway.
         statuses = {}
+        stop_event = threading.Event()
         with ThreadPoolExecutor(max_workers=2) as executor:
             futures = {
-                executor.submit(_poll_kernel, deployment1_kernel_id, poll_interval=polling_interval): deployment1_kernel_id,
-                executor.submit(_poll_kernel, deployment2_kernel_id, poll_interval=polling_interval): deployment2_kernel_id
+                executor.submit(_poll_kernel, deployment1_kernel_id, max_wait=poll_timeout, poll_interval=polling_interval, stop_event=stop_event, initial_interval=initial_polling_interval): deployment1_kernel_id,
+                executor.submit(_poll_kernel, deployment2_kernel_id, max_wait=poll_timeout, poll_interval=polling_interval, stop_event=stop_event, initial_interval=initial_polling_interval): deployment2_kernel_id
             }
             
             for future in as_completed(futures):
@@ -282,6 +356,9 @@ def run_parallel_pipeline(
                 except Exception as e:
                     logging.error(f"Error polling kernel {kernel_id}: {e}")
                     statuses[kernel_id] = f"error: {e}"
+                if "error" in statuses[kernel_id].lower():
+                    stop_event.set()
+                    request_poll()
         
         # Log status summary
         logging.info("="*80)
@@ -308,22 +385,21 @@ def run_parallel_pipeline(
         deployment1_download_path.mkdir(parents=True, exist_ok=True)
         deployment2_download_path.mkdir(parents=True, exist_ok=True)
         
-        # Download from both kernels sequentially
+        # Download from both kernels in parallel; each writes to its own temp dir
         download_errors = []
-        
-        logging.info(f"Downloading from deployment1 kernel: {deployment1_kernel_id}")
-        try:
-            _download_kernel_output(deployment1_kernel_id, deployment1_download_path, expected_count=len(first_batch))
-        except Exception as e:
-            logging.warning(f"Failed to download from deployment1: {e}")
-            download_errors.append(("deployment1", str(e)))
-        
-        logging.info(f"Downloading from deployment2 kernel: {deployment2_kernel_id}")
-        try:
-            _download_kernel_output(deployment2_kernel_id, deployment2_download_path, expected_count=len(second_batch))
-        except Exception as e:
-            logging.warning(f"Failed to download from deployment2: {e}")
-            download_errors.append(("deployment2", str(e)))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                executor.submit(_download_kernel_output, deployment1_kernel_id, deployment1_download_path, expected_count=len(first_batch)): "deployment1",
+                executor.submit(_download_kernel_output, deployment2_kernel_id, deployment2_download_path, expected_count=len(second_batch)): "deployment2"
+            }
+            
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.warning(f"Failed to download from {name}: {e}")
+                    download_errors.append((name, str(e)))
         
         # If both downloads failed, raise error
         if len(download_errors) >= 2:
@@ -337,29 +413,8 @@ def run_parallel_pipeline(
         final_images_path = dest_path / "images"
         final_images_path.mkdir(parents=True, exist_ok=True)
         
-        image_extensions = (".png", ".jpg", ".jpeg")
-        unique_images = {} # Map filename -> Path
-        
-        for temp_path in [deployment1_download_path, deployment2_download_path]:
-            if not temp_path.exists(): continue
-            for image_file in temp_path.rglob("*"):
-                # ONLY collect files that start with 'gen_' to avoid pulling stale artifacts
-                if image_file.is_file() and image_file.suffix.lower() in image_extensions and image_file.name.startswith("gen_"):
-                    # Deduplicate by filename
-                    if image_file.name not in unique_images:
-                        unique_images[image_file.name] = image_file
-        
-        image_count = 0
-        for name, source_path in unique_images.items():
-            target = final_images_path / name
-            # Handle name collisions if they occur across runs, but for this run we deduplicated
-            counter = 1
-            while target.exists():
-                target = final_images_path / f"{source_path.stem}_{counter}{source_path.suffix}"
-                counter += 1
-            shutil.move(str(source_path), str(target))
-            image_count += 1
-            logging.info(f"  Collected: {target.name}")
+        image_count = _merge_images([deployment1_download_path, deployment2_download_path], final_images_path)
+        logging.info(f"Collected {image_count} images into {final_images_path}")
         
         # Check if we got the expected number of images
         expected_images = len(prompts_list)
@@ -1,26 +1,42 @@
 ﻿# main.py
 import argparse
-import subprocess
 import logging
 import os
 import tempfile
 import json
+import re
 import shutil
-import time
 from pathlib import Path
 from typing import Any, Dict
+try:
+    import orjson  # optional: faster parsing of large notebooks
+except ImportError:
+    orjson = None
 from kaggle_connector import JobManager, SelectiveDownloader, DatasetManager
-from imggenhub.kaggle.core.parallel_deploy import run_parallel_pipeline, should_use_parallel
+from imggenhub.kaggle.core.parallel_deploy import run_parallel_pipeline, should_use_parallel, get_dataset_sources, get_notebook_types
 from imggenhub.kaggle.utils.prompts import resolve_prompts
 from imggenhub.kaggle.utils.cli import log_cli_command, setup_output_directory
-from imggenhub.kaggle.utils.filesystem import ensure_output_directory
+from imggenhub.kaggle.utils.filesystem import ensure_output_directory, iter_image_files
 from imggenhub.kaggle.utils.arg_validator import validate_args
 from imggenhub.kaggle.utils.config_loader import load_kaggle_config
+from imggenhub.kaggle.utils.poll_status import poll_until_complete, wait_for_new_run, install_poll_signal_handler, get_kernel_version, INITIAL_POLL_INTERVAL
+from imggenhub.kaggle.utils.deploy_cache import compute_deploy_key, recorded_version, record_deploy
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+# Matches a top-level parameter assignment such as `PROMPTS = [...]`
+_PARAM_ASSIGNMENT_RE = re.compile(r"([A-Z][A-Z0-9_]*)\s*=(?!=)")
 
+# Handed to the connector but never assigned by the bundled notebooks; verifying
+# them would always come up empty and keep the scan from stopping early
+_UNVERIFIED_PARAMS = frozenset({"KERNEL_ID"})
 
-def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, model_id=None, refiner_model_id=None, prompt=None, prompts=None, guidance=None, steps=None, precision=None, negative_prompt=None, refiner_guidance=None, refiner_steps=None, refiner_precision=None, refiner_negative_prompt=None, img_size=None, model_filename=None, vae_repo_id=None, vae_filename=None, clip_l_repo_id=None, clip_l_filename=None, t5xxl_repo_id=None, t5xxl_filename=None, wait_timeout=None, accelerator=None):
+# Auto-selected notebook per FLUX variant: (notebook file, model label, GPU warning label)
+_FLUX_NOTEBOOKS = {
+    "gguf": ("kaggle-flux-gguf.ipynb", "FLUX GGUF", "FLUX GGUF Q4"),
+    "bf16": ("kaggle-flux-schnell-bf16.ipynb", "FLUX bf16", "FLUX bf16"),
+}
+
+
+def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, model_id=None, refiner_model_id=None, prompt=None, prompts=None, guidance=None, steps=None, precision=None, negative_prompt=None, refiner_guidance=None, refiner_steps=None, refiner_precision=None, refiner_negative_prompt=None, img_size=None, model_filename=None, vae_repo_id=None, vae_filename=None, clip_l_repo_id=None, clip_l_filename=None, t5xxl_repo_id=None, t5xxl_filename=None, wait_timeout=None, accelerator=None, force_deploy=False, poll_interval=None, poll_max_interval=None):
     """Run Kaggle image generation pipeline: sync HF token -> deploy -> poll -> download"""
     print("Initializing run_pipeline in main.py...")
     cwd = Path(__file__).parent
@@ -29,8 +45,14 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
     config = load_kaggle_config()
     if wait_timeout is None:
         wait_timeout = config.get("deployment_timeout_minutes", 30)
+    # Kernel polling gives up after the same number of minutes
+    poll_timeout = wait_timeout * 60
     
     retry_interval = config.get("retry_interval_seconds", 60)
+    if poll_interval is None:
+        poll_interval = INITIAL_POLL_INTERVAL
+    if poll_max_interval is None:
+        poll_max_interval = config.get("polling_interval_seconds", 60)
 
     # Sync HF token to Kaggle dataset before deployment
     logging.info("Syncing HF token to Kaggle dataset...")
@@ -49,8 +71,7 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
             
         with tempfile.TemporaryDirectory() as tmp_dir:
             token_file = Path(tmp_dir) / "hf_token.json"
-            with open(token_file, "w") as f:
-                json.dump({"HF_TOKEN": hf_token}, f)
+            token_file.write_text(json.dumps({"HF_TOKEN": hf_token}))
             
             dm = DatasetManager()
             # Use same dataset ID as before
@@ -81,14 +102,14 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
             notebook = local_notebook
         else:
             notebook = kernel_path / notebook.name  # Fallback to kernel path if not in notebooks
+    notebook_types = get_notebook_types(notebook)
+    is_flux_gguf_notebook = "flux-gguf" in notebook_types
 
     prompts_list = resolve_prompts(prompts_file, prompt)
 
     logging.debug(f"Resolved paths:\n prompts_file={prompts_file}\n notebook={notebook}\n kernel_path={kernel_path}\n dest={dest_path}")
 
-    # Resolve username and kernel ID
-    from kaggle import api
-    username = api.config_values.get("username")
+    # Resolve kernel ID (username was resolved from the Kaggle API during the HF token sync)
     base_kernel_id = f"{username}/imggenhub-generator"
 
     # Check if parallel deployment should be used (prompts > 4)
@@ -130,7 +151,9 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
             kernel_path=kernel_path,
             wait_timeout=wait_timeout,
             retry_interval=retry_interval,
-            polling_interval=config.get("polling_interval_seconds", 60),
+            polling_interval=poll_max_interval,
+            initial_polling_interval=poll_interval,
+            poll_timeout=poll_timeout,
             accelerator=accelerator,
             **deploy_kwargs
         )
@@ -148,7 +171,8 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
         tmp_dir_path = Path(tmp_deploy_dir)
         nb_name = Path(notebook).name
         tmp_nb_path = tmp_dir_path / nb_name
-        shutil.copy2(notebook, tmp_nb_path)
+        # Contents only: the temp copy is edited and pushed, its metadata is irrelevant
+        shutil.copyfile(notebook, tmp_nb_path)
         
         # Prepare parameters
         params = {
@@ -163,7 +187,7 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
         }
         
         # Flux GGUF specific
-        if "flux-gguf" in str(notebook).lower():
+        if is_flux_gguf_notebook:
             if model_filename: params["MODEL_FILENAME"] = model_filename
             if vae_repo_id: params["VAE_REPO_ID"] = vae_repo_id
             if vae_filename: params["VAE_FILENAME"] = vae_filename
@@ -175,59 +199,71 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
         manager = JobManager()
         manager.edit_notebook_params(str(tmp_nb_path), params)
         
-        # DEBUG: Check if parameters were correctly injected
-        with open(tmp_nb_path, "r", encoding="utf-8") as f:
-            injected_nb = json.load(f)
-            for cell in injected_nb["cells"]:
-                if cell["cell_type"] == "code":
-                    src = "".join(cell["source"])
-                    logging.info(f"DEBUG: Cell source: {src[:500]}")
-                    if "PROMPTS =" in src:
-                        logging.info("VERIFICATION: Found PROMPTS in notebook.")
-        dataset_sources = [f"{username}/imggenhub-hf-token"]
-        if "flux-gguf" in str(notebook).lower():
-             dataset_sources.extend([
-                f"{username}/flux1-schnell-q4-zip",
-                f"{username}/vae-zip",
-                f"{username}/clip-l-zip",
-                f"{username}/t5xxl-zip",
-                f"{username}/sd-build-zip"
-             ])
+        # Check if parameters were correctly injected
+        injected = _find_injected_params(tmp_nb_path, params.keys() - _UNVERIFIED_PARAMS)
+        logging.info(f"VERIFICATION: Parameters found in notebook: {', '.join(sorted(injected))}")
+        if "PROMPTS" not in injected:
+            logging.warning("VERIFICATION: PROMPTS assignment not found in notebook.")
+        dataset_sources = get_dataset_sources(username, notebook_types)
         
         kernel_type = "notebook" if nb_name.endswith(".ipynb") else "script"
-        manager.create_metadata(
-            str(tmp_dir_path),
-            kernel_id=base_kernel_id,
-            code_file=nb_name,
-            kernel_type=kernel_type,
-            enable_gpu=gpu,
-            dataset_sources=dataset_sources,
-            accelerator=accelerator
-        )
-        
-        # DEBUG: Print metadata
-        with open(tmp_dir_path / "kernel-metadata.json", "r") as f:
-            logging.info(f"VERIFICATION: Created metadata: {f.read()}")
+        metadata = {
+            "kernel_id": base_kernel_id,
+            "code_file": nb_name,
+            "kernel_type": kernel_type,
+            "enable_gpu": gpu,
+            "dataset_sources": dataset_sources,
+            "accelerator": accelerator
+        }
+        manager.create_metadata(str(tmp_dir_path), **metadata)
+        logging.info(f"VERIFICATION: Created metadata: {metadata}")
+        if os.environ.get("IMGGENHUB_VERIFY_METADATA"):
+            # Debug aid: confirm what the connector actually wrote to disk
+            written = json.loads((tmp_dir_path / "kernel-metadata.json").read_bytes())
+            logging.info(f"VERIFICATION: Metadata on disk: {written}")
+            if written.get("code_file") != nb_name:
+                raise RuntimeError(f"kernel-metadata.json code_file is {written.get('code_file')!r}, expected {nb_name!r}")
         
         # 3. Deploy
         # We need to ensure the local kaggle-connector library is using the correct kernel_type
         # If the library version is old, it might not support notebook type properly.
         # But we saw in its code that it supports it via create_metadata.
         
-        manager.deploy(str(tmp_dir_path), wait=True)
+        deploy_key = compute_deploy_key(tmp_nb_path, metadata=metadata)
+        last_version = None if force_deploy else recorded_version(base_kernel_id, deploy_key)
+        # Only reuse output if nobody has pushed a newer version since it was recorded
+        skip_deploy = last_version is not None and get_kernel_version(base_kernel_id) == last_version
+        if skip_deploy:
+            logging.info(f"Notebook and settings unchanged since the last successful run; reusing output of version {last_version} (use --force_deploy to push anyway)")
+        else:
+            # Forget the previous run until this one succeeds
+            record_deploy(base_kernel_id, None)
+            manager.deploy(str(tmp_dir_path), wait=True)
         
     logging.debug("Deploy step completed via connector")
 
     # Step 2: Poll status
-    # Wait for Kaggle API to register the new run
-    logging.info("Waiting 30 seconds for Kaggle API to register the new run...")
-    time.sleep(30)
+    if not skip_deploy:
+        # Wait (up to 30s) for Kaggle API to register the new run
+        logging.info("Waiting for Kaggle API to register the new run...")
+        wait_for_new_run(base_kernel_id, max_wait=30)
     
-    logging.info("Polling kernel status using Kaggle Connector...")
-    manager = JobManager(base_kernel_id)
-    status = manager.poll_until_complete()
+    logging.info("Polling kernel status...")
+    status = poll_until_complete(
+        base_kernel_id,
+        max_interval=poll_max_interval,
+        timeout=poll_timeout,
+        initial_interval=poll_interval
+    )
     logging.debug("Poll status completed")
 
+    if "complete" in status.lower():
+        version = last_version if skip_deploy else get_kernel_version(base_kernel_id)
+        record_deploy(base_kernel_id, deploy_key, version)
+    else:
+        # Never reuse the output of a run that did not complete
+        record_deploy(base_kernel_id, None)
+
     if "error" in status.lower():
         log_path = dest_path / "stable-diffusion-batch-generator.log"
         logging.error(f"Kernel failed. See log: {log_path}")
@@ -246,8 +282,7 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
 
     # Validate image count for sequential deployment
     if not should_use_parallel(prompts_list):
-        image_extensions = {".png", ".jpg", ".jpeg"}
-        actual_images = len([f for f in dest_path.rglob("*") if f.is_file() and f.suffix.lower() in image_extensions and f.name.startswith("gen_")])
+        actual_images = sum(1 for _ in iter_image_files(dest_path))
         expected_images = len(prompts_list)
         if actual_images != expected_images:
             logging.error(f"Incomplete image generation: expected {expected_images} images but got {actual_images}")
@@ -262,6 +297,9 @@ def run_pipeline(dest_path, prompts_file, notebook, kernel_path, gpu=False, mode
 
 def main():
     """Main entry point - focused on argument parsing and orchestration"""
+    # Configure logging here rather than at import so importing the package has no side effects
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
     # First parser for early args only (no help to avoid conflicts)
     early_parser = argparse.ArgumentParser(add_help=False)
     early_parser.add_argument("--dest", type=str, default=None)
@@ -299,6 +337,9 @@ def main():
     parser.add_argument("--img_height", type=int, default=None, help="Image height (defaults: 1024 for stable diffusion, 512 for flux gguf)")
     parser.add_argument("--wait_timeout", type=int, default=None, help="Maximum wait time in minutes for GPU availability (overrides YAML config)")
     parser.add_argument("--accelerator", type=str, default=None, choices=["nvidia-t4-x2", "nvidia-p100"], help="Kaggle accelerator type (e.g., nvidia-t4-x2, nvidia-p100)")
+    parser.add_argument("--force_deploy", action="store_true", help="Push the kernel even if notebook and settings match the last successful run")
+    parser.add_argument("--poll_interval", type=float, default=None, help="Initial seconds between kernel status checks; backs off from here (default: 2)")
+    parser.add_argument("--poll_max_interval", type=float, default=None, help="Maximum seconds between kernel status checks (overrides YAML polling_interval_seconds)")
     
     # FLUX GGUF model configuration (quantized models only)
     parser.add_argument("--model_filename", type=str, default=None, help="Model filename for quantized GGUF models (e.g., flux1-schnell-Q4_0.gguf)")
@@ -318,6 +359,11 @@ def main():
         print(f"Error: {e}")
         return
 
+    for flag, value in (("--poll_interval", args.poll_interval), ("--poll_max_interval", args.poll_max_interval)):
+        if value is not None and value <= 0:
+            print(f"Error: {flag} must be positive.")
+            return
+
     # Check for missing image dimensions before notebook auto-detection
     if args.img_width is None or args.img_height is None:
         print("\n" + "="*80)
@@ -331,34 +377,25 @@ def main():
         print("="*80 + "\n")
         return
 
+    # Classify the model once; notebook selection and the FLUX checks below reuse it
+    is_flux_gguf_id = _is_flux_gguf_model(args.model_id)
+    is_flux_gguf = bool(args.model_filename) or is_flux_gguf_id
+    is_flux_bf16 = _is_flux_bf16_model(args.model_id)
+
     # Auto-detect notebook based on model type if not specified
     if args.notebook is None:
-        # Check if FLUX GGUF based on explicit parameters or model_id
-        is_gguf = (args.model_filename or (args.model_id and _is_flux_gguf_model(args.model_id)))
-        is_bf16 = args.model_id and _is_flux_bf16_model(args.model_id)
-        if is_gguf:
-            args.notebook = str(Path(__file__).parent / "notebooks/kaggle-flux-gguf.ipynb")
-            print(f"Auto-detected FLUX GGUF model, using notebook: {args.notebook}")
-            # Enforce GPU for FLUX GGUF models
+        flux_variant = "gguf" if is_flux_gguf else "bf16" if is_flux_bf16 else None
+        if flux_variant:
+            nb_file, model_label, gpu_label = _FLUX_NOTEBOOKS[flux_variant]
+            args.notebook = str(Path(__file__).parent / "notebooks" / nb_file)
+            print(f"Auto-detected {model_label} model, using notebook: {args.notebook}")
+            # Enforce GPU for FLUX models
             if not args.gpu:
                 print("\n" + "="*80)
-                print("WARNING: FLUX GGUF Q4 MODELS REQUIRE GPU!")
+                print(f"WARNING: {gpu_label} MODELS REQUIRE GPU!")
                 print("="*80)
                 print("You did NOT specify --gpu flag.")
-                print("FLUX GGUF Q4 models cannot run on CPU (too slow and memory-intensive).")
-                print("Automatically enabling GPU mode...")
-                print("="*80 + "\n")
-                args.gpu = True
-        elif is_bf16:
-            args.notebook = str(Path(__file__).parent / "notebooks/kaggle-flux-schnell-bf16.ipynb")
-            print(f"Auto-detected FLUX bf16 model, using notebook: {args.notebook}")
-            # Enforce GPU for FLUX bf16 models
-            if not args.gpu:
-                print("\n" + "="*80)
-                print("WARNING: FLUX bf16 MODELS REQUIRE GPU!")
-                print("="*80)
-                print("You did NOT specify --gpu flag.")
-                print("FLUX bf16 models cannot run on CPU (too slow and memory-intensive).")
+                print(f"{gpu_label} models cannot run on CPU (too slow and memory-intensive).")
                 print("Automatically enabling GPU mode...")
                 print("="*80 + "\n")
                 args.gpu = True
@@ -367,7 +404,7 @@ def main():
             print(f"Using default notebook: {args.notebook}")
     
     # Validate FLUX model dimensions must be multiples of 16
-    if args.model_id and _is_flux_gguf_model(args.model_id):
+    if is_flux_gguf_id:
         # Warn if guidance > 1.0 for FLUX GGUF models
         if args.guidance > 1.0:
             print("\n" + "="*80)
@@ -402,11 +439,7 @@ def main():
     logging.info(f"Using explicit precision: {args.precision}")
 
     # Warn if refiner flags are used with Flux models (they are ignored)
-    is_flux_model = args.model_id and (_is_flux_gguf_model(args.model_id) or _is_flux_bf16_model(args.model_id))
-    is_flux_gguf = args.model_filename or (args.model_id and _is_flux_gguf_model(args.model_id))
-    is_flux_bf16 = args.model_id and _is_flux_bf16_model(args.model_id)
-    
-    if (is_flux_model or is_flux_gguf or is_flux_bf16) and (args.refiner_model_id or args.refiner_guidance or args.refiner_steps or args.refiner_precision or args.refiner_negative_prompt):
+    if (is_flux_gguf or is_flux_bf16) and (args.refiner_model_id or args.refiner_guidance or args.refiner_steps or args.refiner_precision or args.refiner_negative_prompt):
         print("\n" + "="*80)
         print("WARNING: REFINER FLAGS IGNORED FOR FLUX MODELS")
         print("="*80)
@@ -431,6 +464,9 @@ def main():
     except ValueError as e:
         print(f"Error: {e}")
         return
+
+    # `kill -USR1 <pid>` forces an immediate status check while polling
+    install_poll_signal_handler()
     run_pipeline(
         dest_path=dest_path,
         prompts_file=args.prompts_file,
@@ -458,12 +494,43 @@ def main():
         t5xxl_filename=args.t5xxl_filename,
         wait_timeout=args.wait_timeout,
         accelerator=args.accelerator,
+        force_deploy=args.force_deploy,
+        poll_interval=args.poll_interval,
+        poll_max_interval=args.poll_max_interval,
     )
 
 
     # ...existing code...
 
 
+def _find_injected_params(notebook_path: Path, param_names) -> set:
+    """
+    Return the names from param_names that are assigned in the notebook's code cells.
+    Each source line is matched once against a single precompiled pattern,
+    and scanning stops as soon as every name has been found.
+    """
+    debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+    raw = Path(notebook_path).read_bytes()
+    nb = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    remaining = set(param_names)
+    for cell in nb["cells"]:
+        if cell["cell_type"] != "code":
+            continue
+        source = cell["source"]
+        if isinstance(source, str):
+            source = source.splitlines(keepends=True)
+        if debug_enabled:
+            logging.debug(f"Cell source: {''.join(source)[:500]}")
+        for line in source:
+            match = _PARAM_ASSIGNMENT_RE.match(line)
+            if match:
+                remaining.discard(match.group(1))
+                if not remaining:
+                    return set(param_names)
+    return set(param_names) - remaining
+
+
 def _is_kaggle_model(model_id: str) -> bool:
     """
     Check if a model ID refers to a Kaggle model rather than a HuggingFace model.
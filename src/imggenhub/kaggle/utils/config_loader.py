@@ -1,11 +1,19 @@
 import yaml
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict
 
 def load_kaggle_config() -> Dict[str, Any]:
     """
     Load Kaggle configuration from YAML file.
+
+    The file is read once per process; each caller gets its own copy.
     """
+    return dict(_read_kaggle_config())
+
+
+@lru_cache(maxsize=1)
+def _read_kaggle_config() -> Dict[str, Any]:
     config_path = Path(__file__).parent.parent / "config" / "kaggle_settings.yaml"
     if not config_path.exists():
         # Fallback to defaults if file not found
@@ -0,0 +1,79 @@
+"""
+Content-addressed record of the last successful deploy per kernel.
+
+Generation is seeded, so pushing the same notebook with the same settings
+produces the same images again. When a deploy matches the last successful
+one, the push can be skipped and the kernel's existing output reused.
+Each entry also stores the kernel version that produced the output, so the
+output is only reused while that version is still the kernel's latest one
+(a push from another machine or the Kaggle UI invalidates it).
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_FILE = Path.home() / ".cache" / "imggenhub" / "deploy_cache.json"
+
+
+def compute_deploy_key(notebook_path: Path, **inputs: Any) -> str:
+    """
+    Hash the notebook contents together with the deploy settings.
+
+    Args:
+        notebook_path: Notebook with parameters already injected
+        **inputs: JSON-serializable deploy settings (metadata, flags, ...)
+
+    Returns:
+        str: Hex digest identifying this deploy
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8"))
+    hasher.update(Path(notebook_path).read_bytes())
+    return hasher.hexdigest()
+
+
+def _load_cache() -> Dict[str, Any]:
+    try:
+        cache = json.loads(CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def recorded_version(kernel_id: str, deploy_key: str) -> Optional[int]:
+    """
+    Return the kernel version recorded for deploy_key, or None if deploy_key
+    is not the last successful deploy of kernel_id.
+    """
+    entry = _load_cache().get(kernel_id)
+    if not isinstance(entry, dict) or entry.get("key") != deploy_key:
+        return None
+    return entry.get("version")
+
+
+def record_deploy(kernel_id: str, deploy_key: Optional[str], version: Optional[int] = None) -> None:
+    """
+    Store deploy_key and the kernel version it produced as the last successful
+    deploy of kernel_id. Passing None for either forgets the kernel, e.g. while
+    a new deploy is in flight or after a run that did not complete.
+    """
+    cache = _load_cache()
+    if deploy_key is None or version is None:
+        if cache.pop(kernel_id, None) is None:
+            return
+    else:
+        cache[kernel_id] = {"key": deploy_key, "version": version}
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # Write a sibling temp file and swap it in, so concurrent runs never see
+    # (or leave behind) a half-written cache
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_FILE.parent, prefix=CACHE_FILE.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump(cache, tmp_file, indent=2)
+        os.replace(tmp_path, CACHE_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -1,7 +1,17 @@
 """
 Filesystem utilities for directory and file management.
 """
+import errno
+import os
+import shutil
 from pathlib import Path
+from typing import Iterator
+
+# A tuple so it can be passed straight to str.endswith
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Build trees that kernel output may contain; they never hold generated images
+ARTIFACT_DIRECTORIES = frozenset({"stable-diffusion.cpp", "export", ".git", "__pycache__"})
 
 
 def ensure_output_directory(base_dir: str = "outputs") -> Path:
@@ -39,4 +49,53 @@ def create_run_directory(base_dir: str = "outputs", run_name: str = "output_imag
     dest_path = output_base / full_run_name
     dest_path.mkdir(parents=True, exist_ok=True)
 
-    return dest_path
\ No newline at end of file
+    return dest_path
+
+
+def iter_image_files(root: Path, prefix: str = "gen_") -> Iterator[Path]:
+    """
+    Yield generated image files anywhere under root.
+
+    Uses os.scandir so file types come from the directory entries instead of a
+    stat per file, and never descends into ARTIFACT_DIRECTORIES.
+
+    Args:
+        root: Directory to search
+        prefix: Required file name prefix (default: "gen_")
+
+    Returns:
+        Iterator[Path]: Matching image files
+    """
+    pending = [os.fspath(root)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in ARTIFACT_DIRECTORIES:
+                            pending.append(entry.path)
+                    elif (entry.name.startswith(prefix)
+                          and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+                          and entry.is_file()):
+                        yield Path(entry.path)
+        except FileNotFoundError:
+            continue
+
+
+def move_file(src: Path, dst: Path) -> None:
+    """
+    Move src to dst, overwriting dst if it exists.
+
+    Uses a single rename, and only falls back to shutil.move (copy + delete)
+    when src and dst are on different filesystems.
+
+    Args:
+        src: File to move
+        dst: Destination file path
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(os.fspath(src), os.fspath(dst))
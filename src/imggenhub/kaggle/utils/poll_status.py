@@ -0,0 +1,301 @@
+"""
+Kernel status polling for Kaggle kernels.
+
+Status is read in-process through the Kaggle API, over one HTTP session that is
+shared by every poller in the process. The poll interval adapts to
+the kernel lifecycle: it starts short, backs off while the kernel is queued,
+and drops back down once the kernel starts running so completion is noticed
+quickly. request_poll() (wired to SIGUSR1 by install_poll_signal_handler())
+cuts the current wait short so status can be checked on demand.
+"""
+import logging
+import os
+import random
+import signal
+import threading
+import time
+from typing import Optional, Set
+
+INITIAL_POLL_INTERVAL = 2.0
+RUNNING_POLL_INTERVAL = 5.0
+POLL_BACKOFF_FACTOR = 1.5
+# Lowercase KernelWorkerStatus names, compared exactly
+TERMINAL_STATUSES = frozenset({"complete", "error", "cancel_acknowledged"})
+ACTIVE_STATUSES = frozenset({"queued", "running", "new_script", "cancel_requested"})
+# Active statuses that mean a freshly pushed run has been picked up
+NEW_RUN_STATUSES = frozenset({"new_script", "queued", "running"})
+READINESS_POLL_INTERVAL = 2.0
+ABORTED_STATUS = "aborted"
+MAX_CONSECUTIVE_FAILURES = 5
+
+# KaggleApi.kernels_status() opens a new client (and TLS connection) per call,
+# so status requests go through one long-lived client instead. The lock also
+# serializes requests, since a requests.Session is not guaranteed thread-safe.
+_status_client = None
+_status_client_lock = threading.Lock()
+
+# One wake event per active poller. set add/discard/copy are atomic under the GIL.
+_wake_events: Set[threading.Event] = set()
+
+# Write end of the pipe the SIGUSR1 handler pokes, once installed
+_poll_signal_fd: Optional[int] = None
+
+
+def _get_status_client():
+    """Return the shared Kaggle client used for status requests."""
+    global _status_client
+    if _status_client is None:
+        from kaggle import api
+        _status_client = api.build_kaggle_client()
+    return _status_client
+
+
+def get_kernel_status(kernel_id: str) -> str:
+    """
+    Fetch the current status of a kernel from the Kaggle API.
+
+    Args:
+        kernel_id: Kernel identifier (owner/slug)
+
+    Returns:
+        str: Lowercase status name, e.g. "running" or "complete"
+    """
+    from kagglesdk.kernels.types.kernels_api_service import ApiGetKernelSessionStatusRequest
+
+    owner_slug, kernel_slug = kernel_id.split("/", 1)
+    request = ApiGetKernelSessionStatusRequest()
+    request.user_name = owner_slug
+    request.kernel_slug = kernel_slug
+    with _status_client_lock:
+        client = _get_status_client()
+        response = client.kernels.kernels_api_client.get_kernel_session_status(request)
+
+    # response.status is a KernelWorkerStatus enum member; no text parsing needed
+    status = getattr(response.status, "name", str(response.status)).lower()
+    if response.failure_message:
+        logging.warning(f"Kernel {kernel_id} reported: {response.failure_message}")
+    return status
+
+
+def get_kernel_version(kernel_id: str) -> Optional[int]:
+    """
+    Fetch the latest version number of a kernel from the Kaggle API.
+
+    Args:
+        kernel_id: Kernel identifier (owner/slug)
+
+    Returns:
+        Optional[int]: Current version number, or None if it could not be read
+    """
+    from kagglesdk.kernels.types.kernels_api_service import ApiGetKernelRequest
+
+    owner_slug, kernel_slug = kernel_id.split("/", 1)
+    request = ApiGetKernelRequest()
+    request.user_name = owner_slug
+    request.kernel_slug = kernel_slug
+    try:
+        with _status_client_lock:
+            client = _get_status_client()
+            response = client.kernels.kernels_api_client.get_kernel(request)
+    except Exception as e:
+        logging.warning(f"Could not read version of kernel {kernel_id}: {e}")
+        return None
+    metadata = response.metadata
+    # Unset numbers come back as 0
+    return (metadata.current_version_number or None) if metadata else None
+
+
+def request_poll() -> None:
+    """Make every active poller check status now instead of finishing its wait."""
+    for wake in list(_wake_events):
+        wake.set()
+
+
+def install_poll_signal_handler() -> bool:
+    """
+    Call request_poll() whenever the process receives SIGUSR1, e.g. via
+    `kill -USR1 <pid>` right after pushing a kernel by hand.
+
+    The handler itself only writes a byte to a pipe; a daemon thread reads it
+    and calls request_poll(). Setting an Event inside the handler could
+    deadlock, since the interrupted main thread may hold that Event's lock.
+
+    Returns:
+        bool: True if the handler was installed (POSIX main thread only)
+    """
+    global _poll_signal_fd
+    sigusr1 = getattr(signal, "SIGUSR1", None)
+    if sigusr1 is None or threading.current_thread() is not threading.main_thread():
+        return False
+    if _poll_signal_fd is not None:
+        return True
+
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+
+    def _forward_poll_requests():
+        while os.read(read_fd, 64):
+            request_poll()
+
+    def _on_poll_signal(signum, frame):
+        try:
+            os.write(write_fd, b"\0")
+        except BlockingIOError:
+            pass  # pipe full: a poll request is already pending
+
+    threading.Thread(target=_forward_poll_requests, name="poll-signal", daemon=True).start()
+    signal.signal(sigusr1, _on_poll_signal)
+    _poll_signal_fd = write_fd
+    return True
+
+
+def _wait(wake: threading.Event, seconds: float) -> None:
+    """Sleep for up to seconds, returning early if wake is set."""
+    wake.wait(seconds)
+    wake.clear()
+
+
+def is_terminal_status(status: str) -> bool:
+    """Check if a status means the kernel has stopped running."""
+    return status in TERMINAL_STATUSES
+
+
+def _is_client_error(error: Exception) -> bool:
+    """Check if error is an HTTP 4xx response (bad kernel id, auth, ...) other than 429."""
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and 400 <= status_code < 500 and status_code != 429
+
+
+def wait_for_new_run(kernel_id: str, max_wait: float, interval: float = READINESS_POLL_INTERVAL) -> Optional[str]:
+    """
+    Wait until a freshly pushed kernel run is visible as queued or running.
+
+    Right after a push the API can still report the previous run. Instead of
+    sleeping for a fixed time, this returns as soon as the new run shows up and
+    only waits the full max_wait if it never does (e.g. the run already ended).
+
+    Args:
+        kernel_id: Kernel identifier (owner/slug)
+        max_wait: Maximum time to wait in seconds
+        interval: Seconds between status checks
+
+    Returns:
+        Optional[str]: The active status that was seen, or None if max_wait elapsed
+    """
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            status = get_kernel_status(kernel_id)
+        except Exception as e:
+            logging.debug("Readiness check for %s failed: %s", kernel_id, e)
+            status = None
+        if status in NEW_RUN_STATUSES:
+            logging.info(f"Kernel {kernel_id} registered new run ({status})")
+            return status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.info(f"Kernel {kernel_id} new run not visible after {max_wait:.0f}s, polling anyway")
+            return None
+        time.sleep(min(interval, remaining))
+
+
+def poll_until_complete(
+    kernel_id: str,
+    max_interval: float = 60.0,
+    timeout: Optional[float] = None,
+    stop_event: Optional[threading.Event] = None,
+    initial_interval: float = INITIAL_POLL_INTERVAL
+) -> str:
+    """
+    Poll a kernel until it reaches a terminal status.
+
+    The interval starts at initial_interval and grows by POLL_BACKOFF_FACTOR
+    up to max_interval. It is reset to RUNNING_POLL_INTERVAL the first time the
+    kernel is seen running. Failed status checks keep the current interval with
+    jitter so concurrent pollers do not retry in lockstep. A summary of poll
+    count and time spent waiting is logged when polling ends.
+
+    HTTP 4xx errors (e.g. a missing kernel or bad credentials) are not retried.
+    Other failures, and statuses outside ACTIVE_STATUSES, are retried up
+    to MAX_CONSECUTIVE_FAILURES times in a row.
+
+    Polling stops once stop_event is set; call request_poll() after setting
+    it to end a wait that is already in progress.
+
+    Args:
+        kernel_id: Kernel identifier (owner/slug)
+        max_interval: Upper bound in seconds for the poll interval
+        timeout: Optional maximum total wait in seconds
+        stop_event: Optional event that aborts polling when set
+        initial_interval: First poll interval in seconds
+
+    Returns:
+        str: Terminal status of the kernel, or ABORTED_STATUS if stop_event was set
+
+    Raises:
+        TimeoutError: If the kernel does not finish within timeout seconds
+        RuntimeError: If the kernel is unreachable or status checks keep failing
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+    interval = min(initial_interval, max_interval)
+    seen_running = False
+    start = time.monotonic()
+    polls = 0
+    waited = 0.0
+    failures = 0
+    wake = threading.Event()
+    _wake_events.add(wake)
+
+    try:
+        while not stop_event.is_set():
+            polls += 1
+            try:
+                status = get_kernel_status(kernel_id)
+            except Exception as e:
+                if _is_client_error(e):
+                    raise RuntimeError(f"Kernel {kernel_id} unreachable: {e}") from e
+                logging.warning("Status check for %s failed: %s", kernel_id, e)
+                status = None
+
+            if status is not None and is_terminal_status(status):
+                logging.info(f"Kernel {kernel_id} finished with status: {status}")
+                return status
+            if status is not None and status not in ACTIVE_STATUSES:
+                logging.warning("Kernel %s reported unknown status: %s", kernel_id, status)
+                status = None
+
+            if status is None:
+                failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    raise RuntimeError(f"Kernel {kernel_id} status unavailable after {failures} consecutive checks")
+                sleep_for = interval * random.uniform(0.8, 1.2)
+            else:
+                failures = 0
+                if not seen_running and status == "running":
+                    seen_running = True
+                    interval = min(RUNNING_POLL_INTERVAL, max_interval)
+                sleep_for = interval
+                interval = min(interval * POLL_BACKOFF_FACTOR, max_interval)
+                # Logged every poll, so formatting is left to the logging module
+                logging.info("Kernel %s status: %s (next check in %.0fs)", kernel_id, status, sleep_for)
+
+            if timeout is not None:
+                # Never sleep past the deadline: the last check happens right at it
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"Kernel {kernel_id} did not finish within {timeout} seconds")
+                sleep_for = min(sleep_for, remaining)
+            wait_start = time.monotonic()
+            _wait(wake, sleep_for)
+            waited += time.monotonic() - wait_start
+    finally:
+        _wake_events.discard(wake)
+        elapsed = time.monotonic() - start
+        logging.info(
+            f"Polled kernel {kernel_id} {polls} times over {elapsed:.0f}s "
+            f"({waited:.0f}s waiting, {elapsed - waited:.1f}s in status checks)"
+        )
+
+    logging.info(f"Stopped polling kernel {kernel_id}")
+    return ABORTED_STATUS
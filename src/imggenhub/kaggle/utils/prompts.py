@@ -13,13 +13,12 @@ def resolve_prompts(prompts_file=None, prompt=None, prompts=None):
         prompts_path = Path(prompts_file)
         if not prompts_path.is_absolute():
             prompts_path = Path(__file__).parent / prompts_path
-        if prompts_path.exists():
-            with open(prompts_path, "r", encoding="utf-8") as f:
-                prompts_list = json.load(f)
-            if not isinstance(prompts_list, list) or not prompts_list:
-                raise ValueError(f"Prompts file must contain a non-empty list, got: {prompts_list}")
-            return prompts_list
-        else:
-            raise FileNotFoundError(f"Prompts file not found: {prompts_file}")
+        try:
+            prompts_list = json.loads(prompts_path.read_bytes())
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompts file not found: {prompts_file}") from None
+        if not isinstance(prompts_list, list) or not prompts_list:
+            raise ValueError(f"Prompts file must contain a non-empty list, got: {prompts_list}")
+        return prompts_list
 
     raise ValueError("No prompts provided: specify --prompt or --prompts_file")
@@ -1,16 +1,16 @@
 ﻿import pytest
 from unittest.mock import patch, MagicMock
 from pathlib import Path
-import tempfile
-import shutil
 from imggenhub.kaggle.core.parallel_deploy import (
     split_prompts, 
     should_use_parallel, 
-    _create_deployment2_kernel_dir, 
+    get_dataset_sources,
+    get_notebook_types,
     _deploy_single_kernel, 
     _poll_kernel,
     _download_kernel_output,
-    DEPLOYMENT2_KERNEL_ID
+    _merge_images,
+    run_parallel_pipeline
 )
 
 class TestSplitPrompts:
@@ -33,23 +33,10 @@ class TestShouldUseParallel:
     def test_should_use_parallel_false(self):
         assert should_use_parallel(["a"] * 4) is False
 
-class TestCreateDeployment2Dir:
-    @patch("shutil.copy2")
-    def test_create_deployment2_kernel_dir(self, mock_copy2):
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            kernel_path = Path(tmp_dir)
-            notebook = Path("test.ipynb")
-            metadata_file = kernel_path / "kernel-metadata.json"
-            metadata_file.write_text('{"id": "test", "title": "test", "code_file": "test.ipynb"}')
-            
-            with patch("imggenhub.kaggle.core.parallel_deploy.tempfile.mkdtemp") as mock_mkdtemp:
-                mock_mkdtemp.return_value = tmp_dir
-                res = _create_deployment2_kernel_dir(kernel_path, notebook)
-                assert Path(res) == Path(tmp_dir)
-
 class TestDeploySingleKernel:
+    @patch('imggenhub.kaggle.core.parallel_deploy.shutil.copyfile')
     @patch('imggenhub.kaggle.core.parallel_deploy.JobManager')
-    def test_deploy_single_kernel_success(self, mock_jm_class):
+    def test_deploy_single_kernel_success(self, mock_jm_class, mock_copyfile):
         mock_jm = mock_jm_class.return_value
         prompts = ["p1"]
         notebook = Path("nb.ipynb")
@@ -60,16 +47,39 @@ class TestDeploySingleKernel:
         mock_jm.edit_notebook_params.assert_called_once()
         mock_jm.deploy.assert_called_once()
 
-class TestPollKernel:
+    @patch('imggenhub.kaggle.core.parallel_deploy.shutil.copyfile')
     @patch('imggenhub.kaggle.core.parallel_deploy.JobManager')
-    def test_poll_kernel_success(self, mock_jm_class):
+    def test_flux_gguf_overrides_injected_when_set(self, mock_jm_class, mock_copyfile):
         mock_jm = mock_jm_class.return_value
-        mock_jm.poll_until_complete.return_value = "complete"
+        deploy_kwargs = {"model_filename": "flux.gguf", "t5xxl_filename": "t5.gguf", "clip_l_repo_id": None}
+
+        _deploy_single_kernel(["p1"], Path("kaggle-flux-gguf.ipynb"), Path("/path"), "id", deploy_kwargs)
+        params = mock_jm.edit_notebook_params.call_args.args[1]
+        assert params["MODEL_FILENAME"] == "flux.gguf"
+        assert params["T5XXL_FILENAME"] == "t5.gguf"
+        assert "CLIP_L_REPO_ID" not in params
+
+class TestPollKernel:
+    @patch('imggenhub.kaggle.core.parallel_deploy.poll_until_complete')
+    def test_poll_kernel_success(self, mock_poll):
+        mock_poll.return_value = "complete"
         
         res = _poll_kernel("id", poll_interval=10)
         assert res == "complete"
-        mock_jm_class.assert_called_with("id")
-        mock_jm.poll_until_complete.assert_called_with(pool_interval=10)
+        mock_poll.assert_called_with("id", max_interval=10, timeout=1800, stop_event=None, initial_interval=2.0)
+
+class TestRunParallelPipeline:
+    @patch('imggenhub.kaggle.core.parallel_deploy._merge_images', return_value=5)
+    @patch('imggenhub.kaggle.core.parallel_deploy._download_kernel_output')
+    @patch('imggenhub.kaggle.core.parallel_deploy._poll_kernel', return_value="complete")
+    @patch('imggenhub.kaggle.core.parallel_deploy.wait_for_new_run')
+    @patch('imggenhub.kaggle.core.parallel_deploy._deploy_single_kernel')
+    def test_wait_timeout_caps_polling(self, mock_deploy, mock_wait, mock_poll, mock_download, mock_merge, tmp_path):
+        run_parallel_pipeline(
+            tmp_path, ["p"] * 5, Path("nb.ipynb"), Path("/path"),
+            wait_timeout=5, retry_interval=10, polling_interval=10
+        )
+        assert [c.kwargs["max_wait"] for c in mock_poll.call_args_list] == [300, 300]
 
 class TestDownloadKernel:
     @patch('imggenhub.kaggle.core.parallel_deploy.SelectiveDownloader')
@@ -81,3 +91,35 @@ class TestDownloadKernel:
         _download_kernel_output("id", dest, expected_count=5)
         mock_sd_class.assert_called_with("id", dest=str(dest))
         mock_sd.download_images.assert_called_with(expected_image_count=5, stable_count_patience=4)
+
+class TestMergeImages:
+    def test_dedupes_and_renames_collisions(self, tmp_path):
+        dep1, dep2, dest = tmp_path / "dep1", tmp_path / "dep2", tmp_path / "images"
+        for folder in (dep1, dep2, dest):
+            folder.mkdir()
+        (dep1 / "gen_0.png").write_bytes(b"first")
+        (dep2 / "gen_0.png").write_bytes(b"second")
+        (dep2 / "gen_1.png").write_bytes(b"")
+        (dep2 / "notes.txt").write_bytes(b"")
+        (dest / "gen_1.png").write_bytes(b"old")
+
+        assert _merge_images([dep1, dep2], dest) == 2
+        assert sorted(p.name for p in dest.iterdir()) == ["gen_0.png", "gen_1.png", "gen_1_1.png"]
+        assert (dest / "gen_0.png").read_bytes() == b"first"
+
+class TestGetDatasetSources:
+    def test_default_sources(self):
+        assert get_dataset_sources("user", frozenset()) == ["user/imggenhub-hf-token"]
+
+    def test_flux_gguf_sources(self):
+        sources = get_dataset_sources("user", {"flux-gguf"})
+        assert sources[0] == "user/imggenhub-hf-token"
+        assert "user/flux1-schnell-q4-zip" in sources
+        assert len(sources) == 6
+
+class TestGetNotebookTypes:
+    def test_flux_gguf_notebook(self):
+        assert get_notebook_types(Path("notebooks/Kaggle-FLUX-GGUF.ipynb")) == {"flux-gguf"}
+
+    def test_stable_diffusion_notebook(self):
+        assert get_notebook_types("notebooks/kaggle-stable-diffusion.ipynb") == frozenset()
@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import patch
+from imggenhub.kaggle.utils import deploy_cache
+from imggenhub.kaggle.utils.deploy_cache import compute_deploy_key, recorded_version, record_deploy
+
+
+@pytest.fixture(autouse=True)
+def cache_file(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "deploy_cache.json"
+    monkeypatch.setattr(deploy_cache, "CACHE_FILE", path)
+    return path
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    path = tmp_path / "nb.ipynb"
+    path.write_text('{"cells": []}')
+    return path
+
+
+class TestComputeDeployKey:
+    def test_same_inputs_same_key(self, notebook):
+        assert compute_deploy_key(notebook, metadata={"gpu": True}) == compute_deploy_key(notebook, metadata={"gpu": True})
+
+    def test_settings_change_key(self, notebook):
+        assert compute_deploy_key(notebook, metadata={"gpu": True}) != compute_deploy_key(notebook, metadata={"gpu": False})
+
+    def test_notebook_change_key(self, notebook):
+        before = compute_deploy_key(notebook)
+        notebook.write_text('{"cells": [1]}')
+        assert compute_deploy_key(notebook) != before
+
+
+class TestRecordDeploy:
+    def test_unknown_kernel_has_no_version(self):
+        assert recorded_version("user/kernel", "abc") is None
+
+    def test_recorded_key_returns_version(self, cache_file):
+        record_deploy("user/kernel", "abc", 3)
+        assert cache_file.exists()
+        assert recorded_version("user/kernel", "abc") == 3
+        assert recorded_version("user/kernel", "def") is None
+
+    def test_none_forgets_kernel(self):
+        record_deploy("user/kernel", "abc", 3)
+        record_deploy("user/kernel", None)
+        assert recorded_version("user/kernel", "abc") is None
+
+    def test_missing_version_forgets_kernel(self):
+        record_deploy("user/kernel", "abc", 3)
+        record_deploy("user/kernel", "abc", None)
+        assert recorded_version("user/kernel", "abc") is None
+
+    def test_legacy_entry_is_ignored(self, cache_file):
+        cache_file.parent.mkdir(parents=True)
+        cache_file.write_text('{"user/kernel": "abc"}')
+        assert recorded_version("user/kernel", "abc") is None
+
+    def test_corrupt_cache_is_ignored(self, cache_file):
+        cache_file.parent.mkdir(parents=True)
+        cache_file.write_text("not json")
+        assert recorded_version("user/kernel", "abc") is None
+
+    def test_non_object_cache_is_ignored(self, cache_file):
+        cache_file.parent.mkdir(parents=True)
+        cache_file.write_text("[]")
+        assert recorded_version("user/kernel", "abc") is None
+        record_deploy("user/kernel", "abc", 3)
+        assert recorded_version("user/kernel", "abc") == 3
+
+    def test_write_is_atomic(self, cache_file):
+        record_deploy("user/kernel", "abc", 3)
+        with patch("imggenhub.kaggle.utils.deploy_cache.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                record_deploy("other/kernel", "def", 1)
+        # The previous cache is untouched and no temp file is left behind
+        assert recorded_version("user/kernel", "abc") == 3
+        assert [p.name for p in cache_file.parent.iterdir()] == [cache_file.name]
@@ -0,0 +1,47 @@
+import errno
+from unittest.mock import patch
+from imggenhub.kaggle.utils.filesystem import iter_image_files, move_file
+
+
+class TestIterImageFiles:
+    def test_finds_generated_images_recursively(self, tmp_path):
+        (tmp_path / "images").mkdir()
+        (tmp_path / "gen_0.png").write_bytes(b"")
+        (tmp_path / "images" / "gen_1.JPG").write_bytes(b"")
+        (tmp_path / "other.png").write_bytes(b"")
+        (tmp_path / "gen_log.txt").write_bytes(b"")
+
+        names = sorted(p.name for p in iter_image_files(tmp_path))
+        assert names == ["gen_0.png", "gen_1.JPG"]
+
+    def test_skips_artifact_directories(self, tmp_path):
+        artifacts = tmp_path / "stable-diffusion.cpp" / "assets"
+        artifacts.mkdir(parents=True)
+        (artifacts / "gen_sample.png").write_bytes(b"")
+
+        assert list(iter_image_files(tmp_path)) == []
+
+    def test_missing_root_yields_nothing(self, tmp_path):
+        assert list(iter_image_files(tmp_path / "missing")) == []
+
+
+class TestMoveFile:
+    def test_renames_file(self, tmp_path):
+        src = tmp_path / "gen_0.png"
+        src.write_bytes(b"img")
+        dst = tmp_path / "images" / "gen_0.png"
+        dst.parent.mkdir()
+
+        move_file(src, dst)
+        assert not src.exists()
+        assert dst.read_bytes() == b"img"
+
+    def test_falls_back_to_copy_across_filesystems(self, tmp_path):
+        src = tmp_path / "gen_0.png"
+        src.write_bytes(b"img")
+        dst = tmp_path / "moved.png"
+
+        with patch("imggenhub.kaggle.utils.filesystem.os.replace", side_effect=OSError(errno.EXDEV, "cross-device")):
+            move_file(src, dst)
+        assert not src.exists()
+        assert dst.read_bytes() == b"img"
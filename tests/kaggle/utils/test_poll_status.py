@@ -0,0 +1,240 @@
+import os
+import signal
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from imggenhub.kaggle.utils import poll_status
+from imggenhub.kaggle.utils.poll_status import poll_until_complete, is_terminal_status, request_poll, wait_for_new_run, ABORTED_STATUS
+
+
+def _sleeps(mock_wait):
+    return [c.args[1] for c in mock_wait.call_args_list]
+
+
+def _fake_clock(mock_wait):
+    """Patch time.monotonic with a clock that only advances when mock_wait is called."""
+    now = [0.0]
+
+    def advance(wake, seconds):
+        now[0] += seconds
+
+    mock_wait.side_effect = advance
+    return patch.object(poll_status.time, "monotonic", side_effect=lambda: now[0])
+
+
+class TestIsTerminalStatus:
+    def test_terminal_statuses(self):
+        for status in ["complete", "error", "cancel_acknowledged"]:
+            assert is_terminal_status(status) is True, f"Failed for {status}"
+
+    def test_non_terminal_statuses(self):
+        for status in ["queued", "running", "new_script", "cancel_requested"]:
+            assert is_terminal_status(status) is False, f"Failed for {status}"
+
+
+@patch("imggenhub.kaggle.utils.poll_status._wait")
+class TestPollUntilComplete:
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_returns_terminal_status(self, mock_status, mock_wait):
+        mock_status.side_effect = ["queued", "queued", "complete"]
+
+        assert poll_until_complete("user/kernel") == "complete"
+        assert mock_status.call_count == 3
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_interval_backs_off_up_to_cap(self, mock_status, mock_wait):
+        mock_status.side_effect = ["queued"] * 5 + ["complete"]
+
+        poll_until_complete("user/kernel", max_interval=5.0)
+        assert _sleeps(mock_wait) == [2.0, 3.0, 4.5, 5.0, 5.0]
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_interval_resets_when_running(self, mock_status, mock_wait):
+        mock_status.side_effect = ["queued"] * 4 + ["running", "running", "complete"]
+
+        poll_until_complete("user/kernel", max_interval=60.0)
+        assert _sleeps(mock_wait) == [2.0, 3.0, 4.5, 6.75, 5.0, 7.5]
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_initial_interval_is_configurable(self, mock_status, mock_wait):
+        mock_status.side_effect = ["queued", "queued", "complete"]
+
+        poll_until_complete("user/kernel", initial_interval=10.0, max_interval=12.0)
+        assert _sleeps(mock_wait) == [10.0, 12.0]
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_logs_poll_summary(self, mock_status, mock_wait, caplog):
+        mock_status.side_effect = ["queued", "complete"]
+
+        with caplog.at_level("INFO"):
+            poll_until_complete("user/kernel")
+        assert "Polled kernel user/kernel 2 times" in caplog.text
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_transient_errors_are_retried(self, mock_status, mock_wait):
+        mock_status.side_effect = [ConnectionError("boom"), "error"]
+
+        assert poll_until_complete("user/kernel") == "error"
+        assert 1.6 <= _sleeps(mock_wait)[0] <= 2.4
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_client_error_is_not_retried(self, mock_status, mock_wait):
+        error = Exception("404 Not Found")
+        error.response = MagicMock(status_code=404)
+        mock_status.side_effect = error
+
+        with pytest.raises(RuntimeError, match="unreachable"):
+            poll_until_complete("user/kernel")
+        assert mock_status.call_count == 1
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status", side_effect=ConnectionError("boom"))
+    def test_consecutive_failures_are_capped(self, mock_status, mock_wait):
+        with pytest.raises(RuntimeError, match="consecutive"):
+            poll_until_complete("user/kernel")
+        assert mock_status.call_count == poll_status.MAX_CONSECUTIVE_FAILURES
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_polls_until_cancel_is_acknowledged(self, mock_status, mock_wait):
+        mock_status.side_effect = ["running", "cancel_requested", "cancel_acknowledged"]
+
+        assert poll_until_complete("user/kernel") == "cancel_acknowledged"
+        assert mock_status.call_count == 3
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_unknown_status_counts_as_failure(self, mock_status, mock_wait):
+        mock_status.side_effect = ["mystery"] * 4 + ["running", "mystery", "complete"]
+
+        assert poll_until_complete("user/kernel") == "complete"
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status", return_value="queued")
+    def test_timeout_raises_after_check_at_deadline(self, mock_status, mock_wait):
+        with _fake_clock(mock_wait):
+            with pytest.raises(TimeoutError):
+                poll_until_complete("user/kernel", timeout=10)
+        # Last wait is cut short so the final check lands exactly on the deadline
+        assert _sleeps(mock_wait) == [2.0, 3.0, 4.5, 0.5]
+        assert mock_status.call_count == 5
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_completion_at_deadline_is_not_a_timeout(self, mock_status, mock_wait):
+        mock_status.side_effect = ["queued"] * 4 + ["complete"]
+
+        with _fake_clock(mock_wait):
+            assert poll_until_complete("user/kernel", timeout=10) == "complete"
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status", return_value="queued")
+    def test_stop_event_aborts_polling(self, mock_status, mock_wait):
+        event = threading.Event()
+        event.set()
+
+        assert poll_until_complete("user/kernel", stop_event=event) == ABORTED_STATUS
+        mock_status.assert_not_called()
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status", return_value="complete")
+    def test_wake_event_is_unregistered(self, mock_status, mock_wait):
+        poll_until_complete("user/kernel")
+        assert not poll_status._wake_events
+
+
+class TestRequestPoll:
+    def test_wakes_active_pollers(self):
+        wake = threading.Event()
+        poll_status._wake_events.add(wake)
+        try:
+            request_poll()
+            assert wake.is_set()
+        finally:
+            poll_status._wake_events.discard(wake)
+
+    def test_wait_returns_early_and_rearms(self):
+        wake = threading.Event()
+        wake.set()
+        poll_status._wait(wake, 60)
+        assert not wake.is_set()
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="SIGUSR1 is POSIX only")
+    def test_sigusr1_wakes_pollers_outside_handler(self, monkeypatch):
+        previous = signal.getsignal(signal.SIGUSR1)
+        monkeypatch.setattr(poll_status, "_poll_signal_fd", None)
+        wake = threading.Event()
+        poll_status._wake_events.add(wake)
+        try:
+            assert poll_status.install_poll_signal_handler() is True
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert wake.wait(5)
+        finally:
+            poll_status._wake_events.discard(wake)
+            signal.signal(signal.SIGUSR1, previous)
+
+
+@patch("imggenhub.kaggle.utils.poll_status.time.sleep")
+class TestWaitForNewRun:
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_returns_once_run_is_active(self, mock_status, mock_sleep):
+        mock_status.side_effect = ["complete", ConnectionError("boom"), "queued"]
+
+        assert wait_for_new_run("user/kernel", max_wait=60) == "queued"
+        assert mock_sleep.call_count == 2
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status")
+    def test_cancel_requested_is_not_a_new_run(self, mock_status, mock_sleep):
+        mock_status.side_effect = ["cancel_requested", "new_script"]
+
+        assert wait_for_new_run("user/kernel", max_wait=60) == "new_script"
+
+    @patch("imggenhub.kaggle.utils.poll_status.get_kernel_status", return_value="complete")
+    def test_gives_up_after_max_wait(self, mock_status, mock_sleep):
+        assert wait_for_new_run("user/kernel", max_wait=0) is None
+        mock_sleep.assert_not_called()
+
+
+@pytest.fixture
+def kernels_api():
+    """Real kagglesdk types with the shared status client replaced by a mock."""
+    service = pytest.importorskip("kagglesdk.kernels.types.kernels_api_service")
+    enums = pytest.importorskip("kagglesdk.kernels.types.kernels_enums")
+    client = MagicMock()
+    with patch("imggenhub.kaggle.utils.poll_status._get_status_client", return_value=client):
+        yield service, enums, client.kernels.kernels_api_client
+
+
+class TestGetKernelStatus:
+    def test_maps_enum_to_lowercase_name(self, kernels_api):
+        service, enums, api_client = kernels_api
+        response = service.ApiGetKernelSessionStatusResponse()
+        response.status = enums.KernelWorkerStatus.CANCEL_REQUESTED
+        api_client.get_kernel_session_status.return_value = response
+
+        assert poll_status.get_kernel_status("user/kernel") == "cancel_requested"
+        request = api_client.get_kernel_session_status.call_args.args[0]
+        assert (request.user_name, request.kernel_slug) == ("user", "kernel")
+
+    def test_failure_message_is_logged(self, kernels_api, caplog):
+        service, enums, api_client = kernels_api
+        response = service.ApiGetKernelSessionStatusResponse()
+        response.status = enums.KernelWorkerStatus.ERROR
+        response.failure_message = "CUDA out of memory"
+        api_client.get_kernel_session_status.return_value = response
+
+        with caplog.at_level("WARNING"):
+            assert poll_status.get_kernel_status("user/kernel") == "error"
+        assert "CUDA out of memory" in caplog.text
+
+
+class TestGetKernelVersion:
+    def test_returns_current_version(self, kernels_api):
+        service, _, api_client = kernels_api
+        response = service.ApiGetKernelResponse()
+        response.metadata = service.ApiKernelMetadata()
+        response.metadata.current_version_number = 7
+        api_client.get_kernel.return_value = response
+
+        assert poll_status.get_kernel_version("user/kernel") == 7
+
+    def test_missing_metadata_or_error_gives_none(self, kernels_api):
+        service, _, api_client = kernels_api
+        api_client.get_kernel.return_value = service.ApiGetKernelResponse()
+        assert poll_status.get_kernel_version("user/kernel") is None
+
+        api_client.get_kernel.side_effect = ConnectionError("boom")
+        assert poll_status.get_kernel_version("user/kernel") is None
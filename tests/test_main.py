@@ -1,23 +1,34 @@
+import pytest
 from unittest.mock import patch, MagicMock
+import json
 import logging
 import os
 from pathlib import Path
 from imggenhub.kaggle import main
 
+def _copy_empty_notebook(src, dst):
+    # Stands in for the template copy; run_pipeline reads the copy back
+    Path(dst).write_text(json.dumps({"cells": []}))
+
 def test_run_pipeline_success():
     with patch('imggenhub.kaggle.main.DatasetManager') as mock_dm_cls, \
          patch('imggenhub.kaggle.main.JobManager') as mock_jm_cls, \
          patch('imggenhub.kaggle.main.SelectiveDownloader') as mock_sd_cls, \
          patch('imggenhub.kaggle.main.resolve_prompts', return_value=['prompt']) as mock_resolve, \
          patch('imggenhub.kaggle.main.load_kaggle_config', return_value={}) as mock_config, \
-         patch('imggenhub.kaggle.main.shutil.copy2'):
+         patch('imggenhub.kaggle.main.poll_until_complete', return_value='complete') as mock_poll, \
+         patch('imggenhub.kaggle.main.compute_deploy_key', return_value='key'), \
+         patch('imggenhub.kaggle.main.recorded_version', return_value=None), \
+         patch('imggenhub.kaggle.main.get_kernel_version', return_value=7), \
+         patch('imggenhub.kaggle.main.record_deploy') as mock_record, \
+         patch('imggenhub.kaggle.main.wait_for_new_run'), \
+         patch('imggenhub.kaggle.main.shutil.copyfile', side_effect=_copy_empty_notebook):
         
         # Setup mocks
         mock_dm = mock_dm_cls.return_value
         mock_dm.sync_dataset.return_value = True
         
         mock_jm = mock_jm_cls.return_value
-        mock_jm.poll_until_complete.return_value = 'complete'
         
         mock_sd = mock_sd_cls.return_value
         mock_sd.download_images.return_value = []
@@ -26,7 +37,7 @@ def test_run_pipeline_success():
         
         dest_path = Path("output/test_run")
         dest_path.mkdir(parents=True, exist_ok=True)
-        (dest_path / "test.png").write_text("dummy")
+        (dest_path / "gen_0.png").write_text("dummy")
         
         main.run_pipeline(
             dest_path=dest_path,
@@ -41,8 +52,10 @@ def test_run_pipeline_success():
         
         assert mock_dm.sync_dataset.called
         assert mock_jm.deploy.called
-        assert mock_jm.poll_until_complete.called
+        assert mock_poll.called
+        assert mock_poll.call_args.kwargs["timeout"] == 1800
         assert mock_sd.download_images.called
+        assert mock_record.call_args.args[1:] == ("key", 7)
 
 def test_run_pipeline_kernel_error():
     with patch('imggenhub.kaggle.main.DatasetManager') as mock_dm_cls, \
@@ -50,15 +63,17 @@ def test_run_pipeline_kernel_error():
          patch('imggenhub.kaggle.main.SelectiveDownloader') as mock_sd_cls, \
          patch('imggenhub.kaggle.main.resolve_prompts', return_value=['prompt']) as mock_resolve, \
          patch('imggenhub.kaggle.main.load_kaggle_config', return_value={}) as mock_config, \
-         patch('imggenhub.kaggle.main.shutil.copy2'):
+         patch('imggenhub.kaggle.main.poll_until_complete', return_value='error'), \
+         patch('imggenhub.kaggle.main.compute_deploy_key', return_value='key'), \
+         patch('imggenhub.kaggle.main.recorded_version', return_value=None), \
+         patch('imggenhub.kaggle.main.record_deploy') as mock_record, \
+         patch('imggenhub.kaggle.main.wait_for_new_run'), \
+         patch('imggenhub.kaggle.main.shutil.copyfile', side_effect=_copy_empty_notebook):
         
         # Setup mocks
         mock_dm = mock_dm_cls.return_value
         mock_dm.sync_dataset.return_value = True
         
-        mock_jm = mock_jm_cls.return_value
-        mock_jm.poll_until_complete.return_value = 'error'
-        
         os.environ["HF_TOKEN"] = "test_token"
         
         dest_path = Path("output/test_run")
@@ -76,3 +91,112 @@ def test_run_pipeline_kernel_error():
             assert False, "Expected RuntimeError"
         except RuntimeError:
             pass  # Expected
+        # A failed run must not be reused by the next invocation
+        assert mock_record.call_args.args[1:] == (None,)
+
+@pytest.mark.parametrize("remote_version,expect_deploy", [(7, False), (8, True)])
+def test_run_pipeline_reuses_output_only_for_recorded_version(remote_version, expect_deploy):
+    with patch('imggenhub.kaggle.main.DatasetManager'), \
+         patch('imggenhub.kaggle.main.JobManager') as mock_jm_cls, \
+         patch('imggenhub.kaggle.main.SelectiveDownloader'), \
+         patch('imggenhub.kaggle.main.resolve_prompts', return_value=['prompt']), \
+         patch('imggenhub.kaggle.main.load_kaggle_config', return_value={}), \
+         patch('imggenhub.kaggle.main.poll_until_complete', return_value='complete'), \
+         patch('imggenhub.kaggle.main.compute_deploy_key', return_value='key'), \
+         patch('imggenhub.kaggle.main.recorded_version', return_value=7), \
+         patch('imggenhub.kaggle.main.get_kernel_version', return_value=remote_version), \
+         patch('imggenhub.kaggle.main.record_deploy'), \
+         patch('imggenhub.kaggle.main.wait_for_new_run'), \
+         patch('imggenhub.kaggle.main.shutil.copyfile', side_effect=_copy_empty_notebook):
+
+        os.environ["HF_TOKEN"] = "test_token"
+
+        dest_path = Path("output/test_run")
+        dest_path.mkdir(parents=True, exist_ok=True)
+        (dest_path / "gen_0.png").write_text("dummy")
+
+        main.run_pipeline(
+            dest_path=dest_path,
+            prompts_file='./config/prompts.json',
+            notebook='kaggle-stable-diffusion.ipynb',
+            kernel_path='./config',
+            gpu=True,
+            guidance=7.5,
+            steps=50,
+            precision="fp16"
+        )
+
+        assert mock_jm_cls.return_value.deploy.called is expect_deploy
+
+@pytest.mark.parametrize("prompts", [['prompt'], ['prompt'] * 5])
+def test_run_pipeline_wait_timeout_caps_polling(prompts):
+    with patch('imggenhub.kaggle.main.DatasetManager'), \
+         patch('imggenhub.kaggle.main.JobManager'), \
+         patch('imggenhub.kaggle.main.SelectiveDownloader'), \
+         patch('imggenhub.kaggle.main.resolve_prompts', return_value=prompts), \
+         patch('imggenhub.kaggle.main.load_kaggle_config', return_value={}), \
+         patch('imggenhub.kaggle.main.poll_until_complete', return_value='complete') as mock_poll, \
+         patch('imggenhub.kaggle.main.run_parallel_pipeline') as mock_parallel, \
+         patch('imggenhub.kaggle.main.compute_deploy_key', return_value='key'), \
+         patch('imggenhub.kaggle.main.recorded_version', return_value=None), \
+         patch('imggenhub.kaggle.main.get_kernel_version', return_value=7), \
+         patch('imggenhub.kaggle.main.record_deploy'), \
+         patch('imggenhub.kaggle.main.wait_for_new_run'), \
+         patch('imggenhub.kaggle.main.shutil.copyfile', side_effect=_copy_empty_notebook):
+
+        os.environ["HF_TOKEN"] = "test_token"
+
+        dest_path = Path("output/test_run")
+        dest_path.mkdir(parents=True, exist_ok=True)
+        (dest_path / "gen_0.png").write_text("dummy")
+
+        main.run_pipeline(
+            dest_path=dest_path,
+            prompts_file='./config/prompts.json',
+            notebook='kaggle-stable-diffusion.ipynb',
+            kernel_path='./config',
+            gpu=True,
+            guidance=7.5,
+            steps=50,
+            precision="fp16",
+            wait_timeout=5
+        )
+
+        if mock_parallel.called:
+            assert mock_parallel.call_args.kwargs["poll_timeout"] == 300
+        else:
+            assert mock_poll.call_args.kwargs["timeout"] == 300
+        assert mock_parallel.called is (len(prompts) > 4)
+
+def test_find_injected_params(tmp_path):
+    nb_path = tmp_path / "nb.ipynb"
+    nb_path.write_text(json.dumps({"cells": [
+        {"cell_type": "markdown", "source": ["PROMPTS = ['ignored']\n"]},
+        {"cell_type": "code", "source": ["MODEL_ID = \"x\"\n", "if STEPS == 1:\n", "    GUIDANCE = 1\n"]},
+        {"cell_type": "code", "source": "PROMPTS = ['a']\nSEED = 42\n"},
+    ]}))
+
+    found = main._find_injected_params(nb_path, {"PROMPTS": [], "MODEL_ID": "x", "STEPS": 1, "GUIDANCE": 1})
+    assert found == {"PROMPTS", "MODEL_ID"}
+
+def test_find_injected_params_stops_once_all_found(tmp_path):
+    nb_path = tmp_path / "nb.ipynb"
+    nb_path.write_text(json.dumps({"cells": [
+        {"cell_type": "code", "source": ["PROMPTS = ['a']\n", "MODEL_ID = \"x\"\n"]},
+        {"cell_type": "code"},  # never reached
+    ]}))
+
+    assert main._find_injected_params(nb_path, {"PROMPTS": [], "MODEL_ID": "x"}) == {"PROMPTS", "MODEL_ID"}
+
+
+@pytest.mark.parametrize("notebook,extra_params", [
+    ("kaggle-stable-diffusion.ipynb", ()),
+    ("kaggle-flux-schnell-bf16.ipynb", ()),
+    ("kaggle-flux-gguf.ipynb", ("MODEL_FILENAME", "VAE_REPO_ID", "VAE_FILENAME", "CLIP_L_REPO_ID",
+                                "CLIP_L_FILENAME", "T5XXL_REPO_ID", "T5XXL_FILENAME")),
+])
+def test_bundled_notebooks_assign_every_verified_param(notebook, extra_params):
+    # The scan can only stop early if every verified name is actually assigned
+    nb_path = Path(main.__file__).parent / "notebooks" / notebook
+    names = {"PROMPTS", "MODEL_ID", "GUIDANCE", "STEPS", "PRECISION", "OUTPUT_DIR", "IMG_SIZE", *extra_params}
+    assert main._find_injected_params(nb_path, names) == names